@@ -0,0 +1,22 @@
+import os
+from dataclasses import dataclass
+from dotenv import load_dotenv
+
+load_dotenv()
+
+@dataclass(frozen=True, slots=True)
+class Cfg:
+    """Immutable application configuration read once from the environment"""
+    client_id: str
+    client_secret: str
+    domain: str
+    test_location_id: str
+
+# Single shared instance; slots make attribute reads cheaper than
+# re-probing os.environ and freezing keeps the shape stable
+CFG = Cfg(
+    client_id=os.getenv('clientId'),
+    client_secret=os.getenv('clientSecret'),
+    domain=os.getenv('domain'),
+    test_location_id=os.getenv('locationId'),
+)
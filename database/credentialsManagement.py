@@ -1,12 +1,40 @@
 import logging
+import time
+from contextlib import contextmanager
 from sqlite3 import Error
-from datetime import datetime, timedelta
 from types import SimpleNamespace  # Add this import
 from . import utils
 
 # Get the logger instance
 logger = logging.getLogger('database')
 
+__all__ = [
+    'store_credentials',
+    'store_credentials_bulk',
+    'credentials_batch',
+    'get_credentials',
+    'get_credentials_expiring_before',
+]
+
+# Hoisted SQL so the same string objects hit sqlite's statement cache on every call
+_SQL_UPSERT_USER = '''
+    INSERT OR REPLACE INTO users
+    (location_id, access_token, refresh_token, expires_at)
+    VALUES (?, ?, ?, ?)
+'''
+
+_SQL_SELECT_USER = '''
+    SELECT location_id, access_token, refresh_token, expires_at, company_id
+    FROM users
+    WHERE location_id = ?
+'''
+
+_SQL_SELECT_EXPIRING = '''
+    SELECT location_id, access_token, refresh_token, expires_at, company_id
+    FROM users
+    WHERE expires_at < ?
+'''
+
 def store_credentials(location_id, access_token, refresh_token, expires_in):
     """
     Store OAuth credentials in the database
@@ -45,57 +73,137 @@ def store_credentials(location_id, access_token, refresh_token, expires_in):
         logger.error(error_msg)
         raise ValueError(error_msg)
     
-    # Calculate expiration timestamp
-    try:
-        current_time = datetime.now()
-        expires_at = current_time + timedelta(seconds=expires_in)  # Now using timedelta correctly
-        
-        logger.debug(f"Calculated token expiration: {expires_at} for location_id: {location_id}")
-    except Exception as e:
-        error_msg = f"Failed to calculate expiration timestamp: {str(e)}"
-        logger.error(error_msg)
-        raise RuntimeError(error_msg)
-    
-    # Get database connection
-    conn = utils.get_db_connection()
-    if conn is None:
-        error_msg = "Failed to establish database connection"
-        logger.error(error_msg)
-        raise RuntimeError(error_msg)
+    # Calculate expiration as an integer Unix timestamp, which is cheaper
+    # to store and compare than an ISO-8601 string
+    expires_at = int(time.time()) + expires_in
+
+    logger.debug("Calculated token expiration: %s for location_id: %s", expires_at, location_id)
     
+    # Borrow a pooled connection; `with conn:` commits on success and
+    # rolls back on exception, replacing the old manual ladder
     try:
-        cursor = conn.cursor()
-        
-        # Insert or replace the credentials
-        cursor.execute('''
-            INSERT OR REPLACE INTO users 
-            (location_id, access_token, refresh_token, expires_at) 
-            VALUES (?, ?, ?, ?)
-        ''', (location_id, access_token, refresh_token, expires_at))
-        
-        # Commit the transaction
-        conn.commit()
-        
-        logger.info(f"Successfully stored credentials for location_id: {location_id}")
+        with utils.borrow_connection() as conn:
+            with conn:
+                conn.execute(_SQL_UPSERT_USER, (location_id, access_token, refresh_token, expires_at))
+
+        logger.info("Successfully stored credentials for location_id: %s", location_id)
         return True
     except Error as e:
         error_msg = f"Database error while storing credentials: {str(e)}"
         logger.error(error_msg)
-        # Rollback in case of error
-        if conn:
-            conn.rollback()
-        raise RuntimeError(error_msg)
-    except Exception as e:
-        error_msg = f"Unexpected error while storing credentials: {str(e)}"
+        raise RuntimeError(error_msg) from e
+
+def store_credentials_bulk(records):
+    """
+    Store multiple sets of OAuth credentials in a single transaction
+
+    Args:
+        records (list): Tuples of (location_id, access_token, refresh_token, expires_in)
+
+    Returns:
+        int: Number of records stored
+
+    Raises:
+        ValueError: If any record is missing required fields
+        RuntimeError: If database operations fail
+    """
+    if not records:
+        return 0
+
+    # Validate and expand every record before touching the database
+    rows = []
+    for location_id, access_token, refresh_token, expires_in in records:
+        if not location_id or not access_token or not refresh_token:
+            error_msg = f"Invalid credential record for location_id: {location_id}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        if not expires_in or not isinstance(expires_in, int):
+            error_msg = "Invalid parameter: expires_in must be a valid integer"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        expires_at = int(time.time()) + expires_in
+        rows.append((location_id, access_token, refresh_token, expires_at))
+
+    with utils.borrow_connection() as conn:
+        try:
+            # One BEGIN...COMMIT around the whole batch, so storing N
+            # credentials costs a single fsync instead of one per row
+            with conn:
+                conn.executemany(_SQL_UPSERT_USER, rows)
+
+            logger.info("Successfully stored credentials for %s locations", len(rows))
+            return len(rows)
+        except Error as e:
+            error_msg = f"Database error while storing credential batch: {str(e)}"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+
+class _CredentialsBatch:
+    """Buffers credential writes so they can be flushed in one transaction"""
+
+    def __init__(self):
+        self._records = []
+
+    def add(self, location_id, access_token, refresh_token, expires_in):
+        """Queue one set of credentials for the next flush"""
+        self._records.append((location_id, access_token, refresh_token, expires_in))
+
+    def flush(self):
+        """Write all queued credentials in a single transaction"""
+        stored = store_credentials_bulk(self._records)
+        self._records = []
+        return stored
+
+@contextmanager
+def credentials_batch():
+    """
+    Context manager that coalesces credential writes into one transaction
+
+    Usage:
+        with credentials_batch() as batch:
+            batch.add(location_id, access_token, refresh_token, expires_in)
+    """
+    batch = _CredentialsBatch()
+    yield batch
+    batch.flush()
+
+def get_credentials_expiring_before(deadline):
+    """
+    Retrieve every credential whose token expires before the deadline
+
+    One indexed SELECT replaces a per-location get_credentials loop, so
+    the background refresher costs a single query per tick regardless of
+    how many locations are stored.
+
+    Args:
+        deadline (int): Unix timestamp; rows with expires_at below this are returned
+
+    Returns:
+        list: SimpleNamespace objects, one per expiring credential
+
+    Raises:
+        RuntimeError: If database operations fail
+    """
+    try:
+        with utils.borrow_connection() as conn:
+            rows = conn.execute(_SQL_SELECT_EXPIRING, (deadline,)).fetchall()
+    except Error as e:
+        error_msg = f"Database error while listing expiring credentials: {str(e)}"
         logger.error(error_msg)
-        # Rollback in case of error
-        if conn:
-            conn.rollback()
-        raise RuntimeError(error_msg)
-    finally:
-        # Always close the connection
-        if conn:
-            conn.close()
+        raise RuntimeError(error_msg) from e
+
+    return [
+        SimpleNamespace(
+            location_id=row['location_id'],
+            access_token=row['access_token'],
+            refresh_token=row['refresh_token'],
+            expires_at=row['expires_at'],
+            company_id=row['company_id']
+        )
+        for row in rows
+    ]
 
 def get_credentials(location_id):
     """
@@ -118,50 +226,28 @@ def get_credentials(location_id):
         logger.error(error_msg)
         raise ValueError(error_msg)
     
-    # Get database connection
-    conn = utils.get_db_connection()
-    if conn is None:
-        error_msg = "Failed to establish database connection"
-        logger.error(error_msg)
-        raise RuntimeError(error_msg)
-    
+    # Borrow a pooled database connection
     try:
-        cursor = conn.cursor()
-        
-        # Query for the credentials
-        cursor.execute('''
-            SELECT location_id, access_token, refresh_token, expires_at, company_id
-            FROM users 
-            WHERE location_id = ?
-        ''', (location_id,))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            # Create a SimpleNamespace object for dot notation access
-            credentials = SimpleNamespace(
-                location_id=result['location_id'],
-                access_token=result['access_token'],
-                refresh_token=result['refresh_token'],
-                expires_at=result['expires_at'],
-                company_id=result['company_id']
-            )
-            
-            logger.info(f"Successfully retrieved credentials for location_id: {location_id}")
-            return credentials
-        else:
-            logger.warning(f"No credentials found for location_id: {location_id}")
-            return None
-            
+        with utils.borrow_connection() as conn:
+            # Query for the credentials
+            result = conn.execute(_SQL_SELECT_USER, (location_id,)).fetchone()
     except Error as e:
         error_msg = f"Database error while retrieving credentials: {str(e)}"
         logger.error(error_msg)
-        raise RuntimeError(error_msg)
-    except Exception as e:
-        error_msg = f"Unexpected error while retrieving credentials: {str(e)}"
-        logger.error(error_msg)
-        raise RuntimeError(error_msg)
-    finally:
-        # Always close the connection
-        if conn:
-            conn.close()
+        raise RuntimeError(error_msg) from e
+
+    if result:
+        # Create a SimpleNamespace object for dot notation access
+        credentials = SimpleNamespace(
+            location_id=result['location_id'],
+            access_token=result['access_token'],
+            refresh_token=result['refresh_token'],
+            expires_at=result['expires_at'],
+            company_id=result['company_id']
+        )
+
+        logger.info("Successfully retrieved credentials for location_id: %s", location_id)
+        return credentials
+    else:
+        logger.warning("No credentials found for location_id: %s", location_id)
+        return None
@@ -1,5 +1,9 @@
 import sqlite3
 import logging
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from sqlite3 import Error
 import os
@@ -13,61 +17,211 @@ logger = logging.getLogger('database')
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv('dbDirName'))
 DB_FILE = os.path.join(DATA_DIR, os.getenv('dbFileName'))
 
+# Maximum number of pooled connections, configurable via environment
+POOL_SIZE = int(os.getenv('dbPoolSize', '5'))
+
+# Remembered after the first successful check so every connection
+# doesn't re-stat the directory
+_DATA_DIR_READY = False
+
 def ensure_data_dir_exists():
     """Ensure the data directory exists"""
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        logger.info(f"Created data directory at: {DATA_DIR}")
+    global _DATA_DIR_READY
+    if _DATA_DIR_READY:
+        return
+    os.makedirs(DATA_DIR, exist_ok=True)
+    _DATA_DIR_READY = True
+    logger.info("Data directory ready at: %s", DATA_DIR)
+
+def configure_connection(conn):
+    """Apply performance tuning PRAGMAs to a new connection"""
+    # WAL lets writers append instead of rewriting a rollback journal,
+    # so commits are cheaper and readers are never blocked by a writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA busy_timeout=5000")
+
+class _ConnectionPool:
+    """Small pool of long-lived SQLite connections shared across threads"""
+
+    def __init__(self, size):
+        self._size = size
+        self._connections = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._pid = os.getpid()
+
+    def acquire(self):
+        """Get a connection from the pool, creating one if under the cap"""
+        # SQLite forbids carrying a connection across fork(); a gunicorn
+        # worker that inherited the preloaded pool must start fresh
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self._size:
+                conn = self._create_connection()
+                self._created += 1
+                return conn
+
+        # Pool is at capacity, wait for a connection to be returned
+        return self._connections.get()
+
+    def _reset_after_fork(self):
+        """
+        Drop connections inherited across fork() without closing them.
+
+        The parent still owns the shared file descriptors, so closing here
+        would write through them; the child just forgets the handles and
+        refills the pool lazily with its own connections.
+        """
+        with self._lock:
+            if os.getpid() == self._pid:
+                return
+            self._connections = queue.Queue(maxsize=self._size)
+            self._created = 0
+            self._pid = os.getpid()
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        self._connections.put(conn)
+
+    def close_all(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                conn = self._connections.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except Error:
+                pass
+
+    def _create_connection(self):
+        ensure_data_dir_exists()
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        configure_connection(conn)
+        return conn
+
+# Process-wide pool shared by all database callers
+_pool = _ConnectionPool(POOL_SIZE)
+atexit.register(_pool.close_all)
+
+@contextmanager
+def borrow_connection():
+    """Borrow a pooled connection and return it to the pool when done"""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
 
 def get_db_connection():
-    """Create a database connection to the SQLite database"""
+    """Create a standalone database connection to the SQLite database"""
     ensure_data_dir_exists()
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(DB_FILE, cached_statements=256)
         conn.row_factory = sqlite3.Row  # This enables column access by name
+        configure_connection(conn)
         return conn
     except Error as e:
-        logger.error(f"Database connection error: {e}")
+        logger.error("Database connection error: %s", e)
         return None
 
+# Schema DDL, shared by first-time creation and the legacy-table rebuild
+_SQL_CREATE_USERS = '''
+    CREATE TABLE IF NOT EXISTS users (
+        location_id TEXT PRIMARY KEY,
+        company_id TEXT,
+        access_token TEXT,
+        refresh_token TEXT,
+        expires_at INTEGER
+    )
+'''
+
+_SQL_CREATE_EXPIRES_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_users_expires_at
+    ON users (expires_at)
+'''
+
+# Set once init_db has completed so re-imports under the reloader or
+# gunicorn --preload don't re-run schema creation
+_DB_INITIALIZED = False
+
 def init_db():
     """Initialize the database with tables if they don't exist"""
-    conn = get_db_connection()
-    if conn is not None:
-        try:
-            cursor = conn.cursor()
-            
-            # Check if users table already exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-            table_exists = cursor.fetchone() is not None
-            
+    global _DB_INITIALIZED
+    if _DB_INITIALIZED:
+        return True
+
+    try:
+        with borrow_connection() as conn:
+            # Remember whether the table predates this run: a pre-existing
+            # table with user_version 0 is a legacy database that still
+            # stores ISO-8601 text expiries and needs migrating
+            table_existed = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+            ).fetchone() is not None
+
             # Create users table for storing OAuth credentials
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    location_id TEXT PRIMARY KEY,
-                    company_id TEXT,
-                    access_token TEXT,
-                    refresh_token TEXT,
-                    expires_at TIMESTAMP
-                )
-            ''')
-            
+            conn.execute(_SQL_CREATE_USERS)
+
+            # The background token refresher filters on expires_at every
+            # tick, so keep that scan off the primary-key index
+            conn.execute(_SQL_CREATE_EXPIRES_INDEX)
+
             conn.commit()
-            
-            # Log appropriate message based on whether table existed
-            if table_exists:
-                logger.info("Tables already exist, database ready to use")
+
+            # user_version doubles as a schema-migration marker: version 1
+            # means epoch-integer expiries. A version-0 database that
+            # already had the table carries ISO-8601 text expiries from
+            # the old schema; integer comparisons against those raise
+            # TypeError and the refresher's WHERE never matches TEXT rows,
+            # so convert them once before stamping the version
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version == 0:
+                if table_existed:
+                    # Rebuild rather than UPDATE: the legacy column has
+                    # TEXT affinity, which would coerce converted values
+                    # straight back to text
+                    with conn:
+                        conn.execute("ALTER TABLE users RENAME TO users_legacy")
+                        conn.execute(_SQL_CREATE_USERS)
+                        # The baseline stored naive local datetimes, so the
+                        # 'utc' modifier (reads the input as local time) keeps
+                        # the converted epoch at the instant originally meant
+                        conn.execute('''
+                            INSERT INTO users (location_id, company_id, access_token, refresh_token, expires_at)
+                            SELECT location_id, company_id, access_token, refresh_token,
+                                   CASE WHEN typeof(expires_at) = 'text'
+                                        THEN CAST(strftime('%s', expires_at, 'utc') AS INTEGER)
+                                        ELSE expires_at
+                                   END
+                            FROM users_legacy
+                        ''')
+                        conn.execute("DROP TABLE users_legacy")
+                        conn.execute(_SQL_CREATE_EXPIRES_INDEX)
+                    logger.info("Migrated legacy text expiries to epoch integers at: %s", DB_FILE)
+                else:
+                    logger.info("Database initialized successfully with new tables at: %s", DB_FILE)
+                conn.execute("PRAGMA user_version = 1")
             else:
-                logger.info(f"Database initialized successfully with new tables at: {DB_FILE}")
-            
+                logger.info("Tables already exist, database ready to use")
+
+            _DB_INITIALIZED = True
             return True
-        except Error as e:
-            logger.error(f"Error initializing database: {e}")
-            return False
-        finally:
-            conn.close()
-    else:
-        logger.error("Error: Could not establish database connection")
+    except Error as e:
+        logger.error("Error initializing database: %s", e)
         return False
 
 # Test the initialization function
@@ -0,0 +1,10 @@
+"""Gunicorn configuration, picked up automatically from the working directory."""
+
+def post_fork(server, worker):
+    """Start per-worker background work after the worker process forks.
+
+    Daemon threads started in the preloaded master don't survive fork(),
+    so each worker spawns its own token refresher here.
+    """
+    from llib.tokenManagement import start_token_refresher
+    start_token_refresher()
@@ -1,9 +1,39 @@
 import json
 import logging
+import threading
+import time
+import orjson
+from dataclasses import dataclass
 
 # Configure logging
 logger = logging.getLogger('checkInventory')
 
+# Cached analysis results keyed by a hash of the inventory payload:
+# (expiry, result). Monitoring dashboards poll the same snapshot
+# repeatedly, so identical payloads skip the re-analysis entirely
+_ANALYSIS_CACHE = {}
+_ANALYSIS_CACHE_LOCK = threading.Lock()
+ANALYSIS_CACHE_TTL = 60  # seconds
+ANALYSIS_CACHE_MAX = 64
+
+def _store_analysis(cache_key, result):
+    """Record an analysis result, clearing the cache when it fills up"""
+    if cache_key is None:
+        return
+    with _ANALYSIS_CACHE_LOCK:
+        if len(_ANALYSIS_CACHE) >= ANALYSIS_CACHE_MAX:
+            _ANALYSIS_CACHE.clear()
+        _ANALYSIS_CACHE[cache_key] = (time.monotonic() + ANALYSIS_CACHE_TTL, result)
+
+@dataclass(frozen=True, slots=True)
+class InventoryItemSummary:
+    """One out-of-stock product; slots avoid a per-instance __dict__"""
+    product_name: str
+    variant_name: str
+    available_quantity: int
+    product_id: str
+    variant_id: str
+
 def check_inventory(inventory_data):
     """
     Analyze inventory data and return statistics about products
@@ -21,62 +51,82 @@ def check_inventory(inventory_data):
         error_msg = "Invalid inventory data provided"
         logger.error(error_msg)
         raise ValueError(error_msg)
-    
+
+    # Key the cache on the canonical payload bytes; a payload that isn't
+    # plain JSON just skips the cache rather than failing
+    try:
+        cache_key = hash(orjson.dumps(inventory_data, option=orjson.OPT_SORT_KEYS))
+    except TypeError:
+        cache_key = None
+
+    if cache_key is not None:
+        with _ANALYSIS_CACHE_LOCK:
+            entry = _ANALYSIS_CACHE.get(cache_key)
+        if entry and entry[0] > time.monotonic():
+            logger.debug("Serving cached analysis for identical inventory snapshot")
+            return entry[1]
+
     try:
         # Extract inventory list from the data
         inventory_list = inventory_data.get('inventory', [])
         
         if not inventory_list:
             logger.warning("No inventory items found in the data")
-            return {
+            result = {
                 "total_products": 0,
                 "out_of_stock_products": [],
                 "out_of_stock_count": 0,
                 "in_stock_count": 0,
                 "summary": "No inventory items found"
             }
+            _store_analysis(cache_key, result)
+            return result
         
         # Count total products
         total_products = len(inventory_list)
         
-        # Find out-of-stock products
+        # Find out-of-stock products; the append is pre-bound and the
+        # in-stock count derived afterwards so the loop only does work
+        # for the (rare) out-of-stock case
         out_of_stock_products = []
-        in_stock_count = 0
-        
+        _append = out_of_stock_products.append
+
         for product in inventory_list:
             available_quantity = product.get('availableQuantity', 0)
-            
+
             if available_quantity == 0:
-                out_of_stock_products.append({
-                    "product_name": product.get('productName', 'Unknown'),
-                    "variant_name": product.get('name', 'Unknown'),
-                    "available_quantity": available_quantity,
-                    "product_id": product.get('product', ''),
-                    "variant_id": product.get('_id', '')
-                })
-            else:
-                in_stock_count += 1
-        
+                _append(InventoryItemSummary(
+                    product_name=product.get('productName', 'Unknown'),
+                    variant_name=product.get('name', 'Unknown'),
+                    available_quantity=available_quantity,
+                    product_id=product.get('product', ''),
+                    variant_id=product.get('_id', '')
+                ))
+
         out_of_stock_count = len(out_of_stock_products)
+        in_stock_count = total_products - out_of_stock_count
         
         # Create summary
         summary = f"Total: {total_products} products, In Stock: {in_stock_count}, Out of Stock: {out_of_stock_count}"
         
-        logger.info(f"Inventory analysis complete: {summary}")
-        
-        return {
+        logger.info("Inventory analysis complete: %s", summary)
+
+        result = {
             "total_products": total_products,
             "out_of_stock_products": out_of_stock_products,
             "out_of_stock_count": out_of_stock_count,
             "in_stock_count": in_stock_count,
             "summary": summary
         }
+        _store_analysis(cache_key, result)
+        return result
         
     except Exception as e:
         error_msg = f"Error analyzing inventory data: {str(e)}"
         logger.error(error_msg)
         raise RuntimeError(error_msg)
 
-with open('item.txt', 'r') as file:
-    data = json.load(file)
-    check_inventory(data)
+# Manual test against a sample payload
+if __name__ == "__main__":
+    with open('item.txt', 'r') as file:
+        check_inventory(json.load(file))
@@ -0,0 +1,24 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One keep-alive pool shared by token refresh and inventory calls, so
+# both reuse the same warm TLS connections to services.leadconnectorhq.com
+# instead of each module maintaining its own pool to the same host.
+# allowed_methods must name POST explicitly: urllib3's default whitelist
+# excludes it, and token exchanges are POSTs
+API_SESSION = requests.Session()
+API_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET', 'POST'],
+        respect_retry_after_header=True
+    )
+))
+API_SESSION.headers.update({
+    'Accept': 'application/json'
+})
@@ -1,28 +1,63 @@
 import logging
 import requests
-import os
-from dotenv import load_dotenv
+import threading
+import time
+from .httpclient import API_SESSION as _session
+from .singleflight import SingleFlight
 from .tokenManagement import ensure_valid_token
 
-load_dotenv()
-
-# Get environment variables
-client_id = os.getenv('clientId')
-client_secret = os.getenv('clientSecret')
-
 # Configure logging
 logger = logging.getLogger('inventory')
 
+# Cached inventory responses keyed by location_id: (expiry, etag, payload).
+# The ETag lets an expired entry be revalidated with a conditional GET
+# instead of re-transferring the whole body
+_INVENTORY_CACHE = {}
+_INVENTORY_CACHE_LOCK = threading.Lock()
+INVENTORY_CACHE_TTL = 60  # seconds
+INVENTORY_CACHE_MAX = 256
+
+# Items fetched per request; most locations fit in a single page
+INVENTORY_PAGE_LIMIT = 1000
+
+# Concurrent cold-cache fetches for the same location share one upstream call
+_fetch_flight = SingleFlight()
+
+# (connect, read) timeout so a stalled upstream can't pin a request thread
+REQUEST_TIMEOUT = (3.05, 30)
+
+def extract_total_count(inventory_data):
+    """
+    Pull the total item count out of an inventory response
+
+    Avoids the `.get('total', [{}])[0]` idiom, whose list-and-dict
+    default is allocated on every call even when 'total' is present.
+
+    Args:
+        inventory_data (dict): Response from the inventory API
+
+    Returns:
+        int: Total item count, 0 when the field is absent or empty
+    """
+    total_list = inventory_data.get('total')
+    return total_list[0].get('total', 0) if total_list else 0
+
+def invalidate_inventory(location_id):
+    """Drop the cached inventory for a location, e.g. after a stock mutation"""
+    with _INVENTORY_CACHE_LOCK:
+        _INVENTORY_CACHE.pop(location_id, None)
+
 def get_inventory(location_id):
     """
-    Get all inventory items for a location
-    
+    Get all inventory items for a location, served from a short-lived
+    cache when the same location was fetched within the TTL
+
     Args:
         location_id (str): The location ID to get inventory for
-        
+
     Returns:
         dict: Complete inventory response with all items
-        
+
     Raises:
         ValueError: If location_id is missing
         RuntimeError: If API requests fail
@@ -31,7 +66,39 @@ def get_inventory(location_id):
         error_msg = "Missing required parameter: location_id"
         logger.error(error_msg)
         raise ValueError(error_msg)
-    
+
+    # Serve from cache if the entry is still fresh; keep a stale entry's
+    # ETag and payload around for conditional revalidation
+    with _INVENTORY_CACHE_LOCK:
+        entry = _INVENTORY_CACHE.get(location_id)
+        if entry and entry[0] > time.monotonic():
+            logger.debug("Serving cached inventory for location_id: %s", location_id)
+            return entry[2]
+
+    etag, cached_payload = (entry[1], entry[2]) if entry else (None, None)
+    new_etag, inventory_data = _fetch_flight.do(
+        location_id, _fetch_inventory, location_id, etag, cached_payload
+    )
+
+    # Store the fresh payload, evicting everything if the cache grows too large
+    with _INVENTORY_CACHE_LOCK:
+        if len(_INVENTORY_CACHE) >= INVENTORY_CACHE_MAX:
+            _INVENTORY_CACHE.clear()
+        _INVENTORY_CACHE[location_id] = (time.monotonic() + INVENTORY_CACHE_TTL, new_etag, inventory_data)
+
+    return inventory_data
+
+def _fetch_inventory(location_id, etag=None, cached_payload=None):
+    """
+    Fetch the full inventory for a location from the LeadConnector API
+
+    When an ETag from a previous fetch is supplied, the first page is
+    requested conditionally; a 304 revalidates the cached payload without
+    re-transferring the body.
+
+    Returns:
+        tuple: (etag, inventory_data) for the fresh or revalidated payload
+    """
     try:
         # Ensure we have a valid access token
         access_token = ensure_valid_token(location_id)
@@ -39,59 +106,65 @@ def get_inventory(location_id):
         # API endpoint
         base_url = "https://services.leadconnectorhq.com/products/inventory"
         
-        # Common headers
+        # Accept lives on the shared session; auth and the API version
+        # are set per call since the session is shared with token POSTs
         headers = {
-            'Accept': 'application/json',
             'Authorization': f'Bearer {access_token}',
             'Version': '2021-07-28'
         }
-        
-        # Step 1: Get total count
-        logger.info(f"Getting total inventory count for location_id: {location_id}")
-        
-        params_count = {
-            'limit': 0,
-            'altId': location_id,
-            'altType': 'location'
-        }
-        
-        response = requests.get(base_url, headers=headers, params=params_count)
-        response.raise_for_status()
-        
-        count_data = response.json()
-        
-        # Extract total count
-        total_items = 0
-        if 'total' in count_data and len(count_data['total']) > 0:
-            total_items = count_data['total'][0].get('total', 0)
-        
-        logger.info(f"Found {total_items} total items for location_id: {location_id}")
-        
-        if total_items == 0:
-            return {
-                'inventory': [],
-                'total': [{'total': 0}],
-                'traceId': count_data.get('traceId', '')
-            }
-        
-        # Step 2: Get all items
-        logger.info(f"Fetching all {total_items} inventory items for location_id: {location_id}")
-        
-        params_all = {
-            'limit': total_items,
+        if etag and cached_payload is not None:
+            headers['If-None-Match'] = etag
+
+
+        # Fetch the first page directly instead of issuing a separate
+        # count-only request; most locations fit in a single page
+        logger.info("Fetching inventory for location_id: %s", location_id)
+
+        params = {
+            'limit': INVENTORY_PAGE_LIMIT,
             'altId': location_id,
             'altType': 'location'
         }
-        
-        response = requests.get(base_url, headers=headers, params=params_all)
+
+        response = _session.get(base_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code == 304 and cached_payload is not None:
+            logger.debug("Inventory unchanged for location_id: %s (304)", location_id)
+            return etag, cached_payload
+
         response.raise_for_status()
-        
+
+        # Capture the validator from the first page before the pagination
+        # loop rebinds `response`
+        new_etag = response.headers.get('ETag')
+
         inventory_data = response.json()
-        
-        logger.info(f"Successfully retrieved {len(inventory_data.get('inventory', []))} items for location_id: {location_id}")
-        
-        return inventory_data
-        
+        items = inventory_data.get('inventory', [])
+
+        # Extract total count
+        total_items = extract_total_count(inventory_data)
+
+        # The conditional header was only for the first page; a 304 on a
+        # follow-up page would slip past raise_for_status with an empty body
+        headers.pop('If-None-Match', None)
+
+        # Page through the remainder for locations larger than one page
+        while len(items) < total_items:
+            params['offset'] = len(items)
+            response = _session.get(base_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+
+            page = response.json().get('inventory', [])
+            if not page:
+                break
+            items.extend(page)
+
+        inventory_data['inventory'] = items
+
+        logger.info("Successfully retrieved %s items for location_id: %s", len(items), location_id)
+
+        return new_etag, inventory_data
+
     except requests.exceptions.RequestException as e:
         error_msg = f"API request failed: {str(e)}"
         logger.error(error_msg)
@@ -115,22 +188,37 @@ def query_inventory_summary(location_id):
         inventory_data = get_inventory(location_id)
         
         items = inventory_data.get('inventory', [])
-        total_count = inventory_data.get('total', [{}])[0].get('total', 0)
-        
-        # Calculate summary statistics
-        total_available = sum(item.get('availableQuantity', 0) for item in items)
-        unique_products = len(set(item.get('product', '') for item in items if item.get('product')))
+        total_count = extract_total_count(inventory_data)
         
+        # Calculate all summary statistics in a single pass over the items
+        total_available = 0
+        unique_products = set()
+        items_with_stock = 0
+        items_out_of_stock = 0
+
+        for item in items:
+            quantity = item.get('availableQuantity', 0)
+            total_available += quantity
+
+            product = item.get('product')
+            if product:
+                unique_products.add(product)
+
+            if quantity > 0:
+                items_with_stock += 1
+            else:
+                items_out_of_stock += 1
+
         summary = {
             'location_id': location_id,
             'total_items': total_count,
             'total_available_quantity': total_available,
-            'unique_products': unique_products,
-            'items_with_stock': len([item for item in items if item.get('availableQuantity', 0) > 0]),
-            'items_out_of_stock': len([item for item in items if item.get('availableQuantity', 0) == 0])
+            'unique_products': len(unique_products),
+            'items_with_stock': items_with_stock,
+            'items_out_of_stock': items_out_of_stock
         }
         
-        logger.info(f"Generated inventory summary for location_id: {location_id}")
+        logger.info("Generated inventory summary for location_id: %s", location_id)
         return summary
         
     except Exception as e:
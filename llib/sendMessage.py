@@ -1,6 +1,9 @@
+import atexit
 import smtplib
 import logging
 import re
+import threading
+import time
 import dns.resolver
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -21,6 +24,81 @@ SENDER_EMAIL = os.getenv('SENDER_EMAIL')
 SENDER_PASSWORD = os.getenv('SENDER_PASSWORD')
 SENDER_NAME = os.getenv('SENDER_NAME', 'GHL Utils')
 
+# Compiled once at import so validation skips the re cache lookup per call;
+# \Z anchors harder than $ (no trailing-newline match)
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')
+
+# Resolver configured once with a bounded lifetime so a slow DNS server
+# can't stall a send for more than a couple of seconds
+_resolver = dns.resolver.Resolver(configure=True)
+_resolver.lifetime = 2.0
+
+# High-volume domains whose MX records are effectively static; skip DNS for these
+_TRUSTED_DOMAINS = frozenset({
+    'gmail.com',
+    'outlook.com',
+    'yahoo.com',
+    'hotmail.com',
+    'icloud.com',
+})
+
+# Cached MX results keyed by domain: (expiry, exists)
+_MX_CACHE = {}
+_MX_CACHE_LOCK = threading.Lock()
+MX_CACHE_TTL = 300  # seconds
+
+# Persistent authenticated SMTP connection shared across sends
+_smtp_lock = threading.Lock()
+_smtp_conn = None
+
+def _get_smtp():
+    """
+    Return a live, authenticated SMTP connection, reconnecting if the
+    previous one has gone stale. Must be called with _smtp_lock held.
+    """
+    global _smtp_conn
+
+    if _smtp_conn is not None:
+        try:
+            if _smtp_conn.noop()[0] == 250:
+                return _smtp_conn
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp()
+
+    logger.debug("Connecting to SMTP server: %s:%s", SMTP_SERVER, SMTP_PORT)
+    conn = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10)
+    conn.starttls()  # Enable TLS encryption
+    conn.login(SENDER_EMAIL, SENDER_PASSWORD)
+
+    _smtp_conn = conn
+    return conn
+
+def _close_smtp():
+    """Quit and discard the persistent SMTP connection, if any"""
+    global _smtp_conn
+
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        _smtp_conn = None
+
+atexit.register(_close_smtp)
+
+def _send_over_shared_connection(target_email, text):
+    """Send one serialized message, rebuilding the connection once if stale"""
+    with _smtp_lock:
+        server = _get_smtp()
+        try:
+            server.sendmail(SENDER_EMAIL, target_email, text)
+        except smtplib.SMTPServerDisconnected:
+            # Connection died between the noop and the send; retry once
+            _close_smtp()
+            server = _get_smtp()
+            server.sendmail(SENDER_EMAIL, target_email, text)
+
 def validate_email_format(email):
     """
     Validate email format using regex
@@ -31,8 +109,7 @@ def validate_email_format(email):
     Returns:
         bool: True if valid format, False otherwise
     """
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return _EMAIL_RE.match(email) is not None
 
 def check_email_domain_exists(email):
     """
@@ -45,10 +122,31 @@ def check_email_domain_exists(email):
         bool: True if domain exists, False otherwise
     """
     try:
-        domain = email.split('@')[1]
-        mx_records = dns.resolver.resolve(domain, 'MX')
-        return len(mx_records) > 0
-    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, Exception):
+        domain = email.split('@')[1].lower()
+
+        # Serve repeat domains from the cache instead of a live DNS round-trip
+        with _MX_CACHE_LOCK:
+            entry = _MX_CACHE.get(domain)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+        try:
+            mx_records = _resolver.resolve(domain, 'MX')
+            exists = len(mx_records) > 0
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            # Definitive answer: the domain has no mail exchanger
+            exists = False
+        except Exception as e:
+            # Timeouts and resolver hiccups are transient; fail this check
+            # without caching so the next attempt retries the lookup
+            logger.warning("MX lookup failed for domain %s: %s", domain, e)
+            return False
+
+        with _MX_CACHE_LOCK:
+            _MX_CACHE[domain] = (time.monotonic() + MX_CACHE_TTL, exists)
+
+        return exists
+    except IndexError:
         return False
 
 def validate_email_exists(email):
@@ -70,13 +168,39 @@ def validate_email_exists(email):
     # Check format
     if not validate_email_format(email):
         raise ValueError(f"Invalid email format: {email}")
-    
+
+    # Well-known providers don't need an MX lookup
+    domain = email.rsplit('@', 1)[1].lower()
+    if domain in _TRUSTED_DOMAINS:
+        return True
+
     # Check domain exists
     if not check_email_domain_exists(email):
         raise ValueError(f"Email domain does not exist: {email}")
-    
+
     return True
 
+def build_payload(subject, message):
+    """
+    Serialize a plain-text message once for reuse across recipients
+
+    The returned text carries every header except To, so bulk senders pay
+    for MIME construction and serialization a single time instead of once
+    per recipient.
+
+    Args:
+        subject (str): Email subject line
+        message (str): The message content to send
+
+    Returns:
+        str: Serialized message text without a To header
+    """
+    msg = MIMEMultipart()
+    msg['From'] = f"{SENDER_NAME} <{SENDER_EMAIL}>"
+    msg['Subject'] = subject
+    msg.attach(MIMEText(message, 'plain'))
+    return msg.as_string()
+
 def send_email(target_email, message, subject="Message from GHL Utils"):
     """
     Send an email to the target email address
@@ -114,11 +238,11 @@ def send_email(target_email, message, subject="Message from GHL Utils"):
     try:
         validate_email_exists(target_email)
     except ValueError as e:
-        logger.error(f"Email validation failed: {str(e)}")
+        logger.error("Email validation failed: %s", e)
         raise
     
     try:
-        logger.info(f"Preparing to send email to: {target_email}")
+        logger.info("Preparing to send email to: %s", target_email)
         
         # Create message
         msg = MIMEMultipart()
@@ -128,21 +252,11 @@ def send_email(target_email, message, subject="Message from GHL Utils"):
         
         # Add message body
         msg.attach(MIMEText(message, 'plain'))
-        
-        # Create SMTP session
-        logger.debug(f"Connecting to SMTP server: {SMTP_SERVER}:{SMTP_PORT}")
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()  # Enable TLS encryption
-        
-        # Login to sender account
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        
-        # Send email
-        text = msg.as_string()
-        server.sendmail(SENDER_EMAIL, target_email, text)
-        server.quit()
-        
-        logger.info(f"Email sent successfully to: {target_email}")
+
+        # Send over the shared authenticated connection
+        _send_over_shared_connection(target_email, msg.as_string())
+
+        logger.info("Email sent successfully to: %s", target_email)
         return True
         
     except smtplib.SMTPAuthenticationError as e:
@@ -202,11 +316,11 @@ def send_html_email(target_email, html_message, subject="Message from GHL Utils"
     try:
         validate_email_exists(target_email)
     except ValueError as e:
-        logger.error(f"Email validation failed: {str(e)}")
+        logger.error("Email validation failed: %s", e)
         raise
     
     try:
-        logger.info(f"Preparing to send HTML email to: {target_email}")
+        logger.info("Preparing to send HTML email to: %s", target_email)
         
         # Create message
         msg = MIMEMultipart('alternative')
@@ -217,21 +331,11 @@ def send_html_email(target_email, html_message, subject="Message from GHL Utils"
         # Add HTML message body
         html_part = MIMEText(html_message, 'html')
         msg.attach(html_part)
-        
-        # Create SMTP session
-        logger.debug(f"Connecting to SMTP server: {SMTP_SERVER}:{SMTP_PORT}")
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()  # Enable TLS encryption
-        
-        # Login to sender account
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        
-        # Send email
-        text = msg.as_string()
-        server.sendmail(SENDER_EMAIL, target_email, text)
-        server.quit()
-        
-        logger.info(f"HTML email sent successfully to: {target_email}")
+
+        # Send over the shared authenticated connection
+        _send_over_shared_connection(target_email, msg.as_string())
+
+        logger.info("HTML email sent successfully to: %s", target_email)
         return True
         
     except Exception as e:
@@ -239,6 +343,64 @@ def send_html_email(target_email, html_message, subject="Message from GHL Utils"
         logger.error(error_msg)
         raise RuntimeError(error_msg)
 
+def send_email_bulk(recipients, message, subject="Message from GHL Utils"):
+    """
+    Send one message to many recipients over a single SMTP connection
+
+    The payload is serialized once and the connection lock is held for
+    the whole batch, so N recipients cost one MIME build and one TLS +
+    AUTH handshake instead of N of each.
+
+    Args:
+        recipients (list): Recipient email addresses
+        message (str): The message content shared by every email
+        subject (str, optional): Subject line shared by every email
+
+    Returns:
+        dict: {'sent': [emails], 'failed': [{'email': ..., 'error': ...}]}
+
+    Raises:
+        ValueError: If message is missing
+        RuntimeError: If email configuration is missing
+    """
+    if not message:
+        error_msg = "Missing required parameter: message"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    if not SENDER_EMAIL or not SENDER_PASSWORD:
+        error_msg = "Email configuration missing. Please set SENDER_EMAIL and SENDER_PASSWORD in environment variables"
+        logger.error(error_msg)
+        raise RuntimeError(error_msg)
+
+    payload = build_payload(subject, message)
+
+    sent = []
+    failed = []
+
+    # Hold the lock once so every recipient shares the same TLS + AUTH handshake
+    with _smtp_lock:
+        for target_email in recipients:
+            try:
+                validate_email_exists(target_email)
+
+                text = f"To: {target_email}\n{payload}"
+                server = _get_smtp()
+                try:
+                    server.sendmail(SENDER_EMAIL, target_email, text)
+                except smtplib.SMTPServerDisconnected:
+                    _close_smtp()
+                    server = _get_smtp()
+                    server.sendmail(SENDER_EMAIL, target_email, text)
+
+                sent.append(target_email)
+                logger.info("Email sent successfully to: %s", target_email)
+            except Exception as e:
+                failed.append({"email": target_email, "error": str(e)})
+                logger.error("Failed to send email to %s: %s", target_email, e)
+
+    return {"sent": sent, "failed": failed}
+
 # Test function
 def test_email_sending():
     """Test function to verify email sending functionality"""
@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls for the same key: the first caller runs
+    the function while the rest wait on its Future and share the result
+    (or its exception).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func at most once per key at a time
+
+        Args:
+            key: Hashable key identifying the unit of work
+            func: The function to execute
+            *args, **kwargs: Arguments forwarded to func
+
+        Returns:
+            The result of func, shared across concurrent callers
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                leader = True
+
+        if not leader:
+            # Another caller is already fetching; wait for its result
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -1,19 +1,80 @@
 import logging
+import orjson
 import requests
-from datetime import datetime
-from database.credentialsManagement import get_credentials, store_credentials
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Get environment variables
-client_id = os.getenv('clientId')
-client_secret = os.getenv('clientSecret')
+import threading
+import time
+from types import SimpleNamespace
+from config import CFG
+from database.credentialsManagement import get_credentials, store_credentials, get_credentials_expiring_before
+from .httpclient import API_SESSION
 
 # Configure logging
 logger = logging.getLogger('tokenManagement')
 
+# Token POSTs go over the process-wide API session so they share warm
+# TLS connections with the inventory calls to the same host; the alias
+# keeps the module-level name callers and tests already swap out
+TOKEN_SESSION = API_SESSION
+
+# (connect, read) timeout for calls to the token endpoint
+TOKEN_TIMEOUT = (3.05, 10)
+
+# Token endpoint and the request parts that never change between calls;
+# only the refresh_token field varies per refresh
+TOKEN_URL = "https://services.leadconnectorhq.com/oauth/token"
+_TOKEN_HEADERS = {
+    'Content-Type': 'application/x-www-form-urlencoded'
+}
+_BASE_TOKEN_PAYLOAD = {
+    'client_id': CFG.client_id,
+    'client_secret': CFG.client_secret,
+    'grant_type': 'refresh_token',
+    'user_type': 'Location'
+}
+
+# Cached credentials keyed by location_id: (deadline, credentials).
+# A None credentials value is a short negative cache for unknown locations
+_CRED_CACHE = {}
+_CRED_LOCK = threading.Lock()
+CRED_CACHE_TTL = 30  # seconds
+CRED_NEGATIVE_TTL = 5  # seconds
+
+def _get_cached_credentials(location_id):
+    """Fetch credentials through a short TTL cache to skip repeat DB reads"""
+    with _CRED_LOCK:
+        entry = _CRED_CACHE.get(location_id)
+    if entry and time.monotonic() < entry[0]:
+        return entry[1]
+
+    credentials = get_credentials(location_id)
+
+    if credentials is None:
+        deadline = time.monotonic() + CRED_NEGATIVE_TTL
+    else:
+        # Never cache beyond a minute before the token's own expiry
+        ttl = CRED_CACHE_TTL
+        if credentials.expires_at:
+            ttl = min(ttl, max(credentials.expires_at - time.time() - 60, 0))
+        deadline = time.monotonic() + ttl
+
+    with _CRED_LOCK:
+        _CRED_CACHE[location_id] = (deadline, credentials)
+
+    return credentials
+
+# Per-location locks so concurrent expiry checks trigger exactly one refresh
+_REFRESH_LOCKS = {}
+_REFRESH_LOCKS_GUARD = threading.Lock()
+
+def _refresh_lock_for(location_id):
+    """Return the lock that serializes refreshes for one location"""
+    with _REFRESH_LOCKS_GUARD:
+        lock = _REFRESH_LOCKS.get(location_id)
+        if lock is None:
+            lock = threading.Lock()
+            _REFRESH_LOCKS[location_id] = lock
+        return lock
+
 def refresh_access_token(location_id):
     """
     Refresh the access token using the refresh token
@@ -45,28 +106,16 @@ def refresh_access_token(location_id):
         logger.error(error_msg)
         raise RuntimeError(error_msg)
     
-    # Prepare refresh token request
-    token_url = "https://services.leadconnectorhq.com/oauth/token"
-    
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    
-    data = {
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'grant_type': 'refresh_token',
-        'refresh_token': credentials.refresh_token,
-        'user_type': 'Location'
-    }
-    
+    # Only the refresh token varies; everything else is a module constant
+    data = {**_BASE_TOKEN_PAYLOAD, 'refresh_token': credentials.refresh_token}
+
     try:
-        logger.info(f"Refreshing access token for location_id: {location_id}")
-        response = requests.post(token_url, headers=headers, data=data)
+        logger.info("Refreshing access token for location_id: %s", location_id)
+        response = TOKEN_SESSION.post(TOKEN_URL, headers=_TOKEN_HEADERS, data=data, timeout=TOKEN_TIMEOUT)
         response.raise_for_status()
         
-        # Parse the response
-        token_data = response.json()
+        # Parse the response (orjson is several times faster than stdlib json)
+        token_data = orjson.loads(response.content)
         
         # Extract new tokens
         new_access_token = token_data.get('access_token')
@@ -80,8 +129,20 @@ def refresh_access_token(location_id):
         
         # Store new credentials
         store_credentials(location_id, new_access_token, new_refresh_token, expires_in)
-        
-        logger.info(f"Successfully refreshed tokens for location_id: {location_id}")
+
+        # Push the fresh credentials straight into the cache so readers
+        # pick them up without another DB round-trip
+        refreshed = SimpleNamespace(
+            location_id=location_id,
+            access_token=new_access_token,
+            refresh_token=new_refresh_token,
+            expires_at=int(time.time()) + expires_in,
+            company_id=credentials.company_id
+        )
+        with _CRED_LOCK:
+            _CRED_CACHE[location_id] = (time.monotonic() + CRED_CACHE_TTL, refreshed)
+
+        logger.info("Successfully refreshed tokens for location_id: %s", location_id)
         return True
         
     except requests.exceptions.RequestException as e:
@@ -93,6 +154,47 @@ def refresh_access_token(location_id):
         logger.error(error_msg)
         raise RuntimeError(error_msg)
 
+# How close to expiry a token may get before the background refresher
+# renews it, and how often the refresher wakes up
+REFRESH_AHEAD_SECONDS = 300
+REFRESH_INTERVAL_SECONDS = 60
+
+def refresh_due_tokens():
+    """Refresh every stored credential that is close to expiry"""
+    deadline = time.time() + REFRESH_AHEAD_SECONDS
+
+    # One indexed SELECT returns just the expiring rows, instead of
+    # walking every location and re-reading its credentials
+    try:
+        due = get_credentials_expiring_before(deadline)
+    except Exception as e:
+        logger.error("Token refresher could not list expiring credentials: %s", e)
+        return
+
+    for credentials in due:
+        location_id = credentials.location_id
+        try:
+            with _refresh_lock_for(location_id):
+                # Re-check under the lock; an inline refresh may have
+                # already renewed this location since the SELECT ran
+                current = _get_cached_credentials(location_id)
+                if current and current.expires_at and current.expires_at < deadline:
+                    refresh_access_token(location_id)
+        except Exception as e:
+            logger.error("Background refresh failed for location_id %s: %s", location_id, e)
+
+def _refresher_loop():
+    while True:
+        time.sleep(REFRESH_INTERVAL_SECONDS)
+        refresh_due_tokens()
+
+def start_token_refresher():
+    """Start the daemon thread that proactively refreshes expiring tokens"""
+    thread = threading.Thread(target=_refresher_loop, name='token-refresher', daemon=True)
+    thread.start()
+    logger.info("Background token refresher started")
+    return thread
+
 def ensure_valid_token(location_id):
     """
     Check if the access token is expired and refresh if needed
@@ -113,26 +215,33 @@ def ensure_valid_token(location_id):
         raise ValueError(error_msg)
     
     try:
-        credentials = get_credentials(location_id)
+        credentials = _get_cached_credentials(location_id)
         if not credentials:
             error_msg = f"No credentials found for location_id: {location_id}"
             logger.error(error_msg)
             raise ValueError(error_msg)
         
-        # Check if token is expired
+        # Check if the token is expired or about to be; the background
+        # refresher normally renews tokens first, so this inline path is
+        # only a safety net for scheduler misses and clock skew
         if credentials.expires_at:
-            expires_at = datetime.fromisoformat(credentials.expires_at)
-            current_time = datetime.now()
-            
-            if current_time >= expires_at:
-                logger.info(f"Token expired for location_id: {location_id}, refreshing...")
-                refresh_access_token(location_id)
-                # Get updated credentials
-                credentials = get_credentials(location_id)
-                if not credentials:
-                    raise RuntimeError("Failed to retrieve updated credentials after refresh")
+            if time.time() >= credentials.expires_at - 60:
+                with _refresh_lock_for(location_id):
+                    # Double-checked locking: another thread may have
+                    # refreshed while we waited for the lock, so re-read
+                    # before paying for a token POST
+                    credentials = _get_cached_credentials(location_id)
+                    if credentials and credentials.expires_at and time.time() >= credentials.expires_at - 60:
+                        logger.info("Token expired for location_id: %s, refreshing...", location_id)
+                        refresh_access_token(location_id)
+                        # Get updated credentials (refresh pushed them into the cache)
+                        credentials = _get_cached_credentials(location_id)
+                    if not credentials:
+                        raise RuntimeError("Failed to retrieve updated credentials after refresh")
             else:
-                logger.debug(f"Token still valid for location_id: {location_id}")
+                # Deferred %-formatting: the string is only built if DEBUG
+                # is actually enabled, not once per authenticated request
+                logger.debug("Token still valid for location_id: %s", location_id)
         
         return credentials.access_token
         
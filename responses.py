@@ -0,0 +1,19 @@
+import orjson
+from flask import Response
+
+def ojson(payload, status=200):
+    """
+    Build a JSON response with orjson instead of flask.jsonify
+
+    orjson serializes nested dicts and lists several times faster than
+    the stdlib encoder behind jsonify and emits bytes directly, skipping
+    the separate UTF-8 encode.
+
+    Args:
+        payload: JSON-serializable response body
+        status (int, optional): HTTP status code
+
+    Returns:
+        Response: Flask response with an application/json body
+    """
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
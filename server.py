@@ -1,29 +1,57 @@
-from flask import Flask, request, jsonify, redirect
-from types import SimpleNamespace
-import os
+from flask import Flask, request, redirect
+from responses import ojson
+from flask_compress import Compress
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 import logging
+import orjson
 import requests
+from config import CFG
 from database.credentialsManagement import store_credentials
 from database.utils import init_db
+from llib.tokenManagement import TOKEN_SESSION, TOKEN_TIMEOUT, start_token_refresher
 from testEndpoints import test_bp  # Import the test blueprint
 
 # Load environment variables
 load_dotenv()
-client_id = os.getenv('clientId')
-client_secret = os.getenv('clientSecret')
-domain = os.getenv('domain')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('server')
 
-# Initialize the database
+# Initialize the database. Under gunicorn --preload this runs once in the
+# master; the connection pool is fork-aware, so each worker discards the
+# inherited handles and opens its own. The token refresher is NOT started
+# here: threads don't survive fork(), so gunicorn starts one per worker
+# from the post_fork hook in gunicorn.conf.py
 init_db()
 
+# OAuth scopes requested during installation
+OAUTH_SCOPES = ["products.readonly", "products/prices.readonly"]
+
+# Every field of the redirect URL is env-derived and static, so build it
+# once at import; urlencode also fixes the previously unencoded
+# redirect_uri and scope values
+OAUTH_REDIRECT_URL = (
+    "https://marketplace.gohighlevel.com/oauth/chooselocation?"
+    + urlencode({
+        'response_type': 'code',
+        'redirect_uri': CFG.domain + "/oauth/callback",
+        'client_id': CFG.client_id,
+        'scope': ' '.join(OAUTH_SCOPES),
+    })
+)
+
 # Initialize Flask app
 app = Flask(__name__)
 
+# Compress large responses when the client advertises support; the
+# inventory endpoints can return hundreds of KB of repetitive JSON that
+# gzips down by 5-10x, so transfer time dominates without this
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+Compress(app)
+
 # Register test endpoints blueprint
 app.register_blueprint(test_bp)
 
@@ -31,26 +59,8 @@ app.register_blueprint(test_bp)
 @app.route('/oauth/initiate', methods=['GET'])
 def initiate_auth():
     """Initiate OAuth authentication flow"""
-    # Config variables for oauth initiation call
-    configs = SimpleNamespace(
-        baseUrl="https://marketplace.gohighlevel.com/oauth/chooselocation?",
-        requestType="code",
-        redirectUri=domain + "/oauth/callback",
-        clientId=client_id,
-        scopes=["products.readonly", "products/prices.readonly"],
-    )
-
-    # Construct the redirect url for oauth initiation
-    redirect_url = (
-        f"{configs.baseUrl}"
-        f"response_type={configs.requestType}&"
-        f"redirect_uri={configs.redirectUri}&"
-        f"client_id={configs.clientId}&"
-        f"scope={' '.join(configs.scopes)}"
-    )
-
-    # Redirect the caller to the constructed url
-    return redirect(redirect_url)
+    # Redirect the caller to the URL prebuilt at import time
+    return redirect(OAUTH_REDIRECT_URL)
 
 @app.route('/oauth/callback', methods=['GET'])
 def authenticate():
@@ -61,14 +71,14 @@ def authenticate():
     state = request.args.get('state')
     
     # Add logging to see what we received
-    logging.info(f"Received callback with code: {auth_code[:10] if auth_code else 'None'}...")
-    logging.info(f"Received state: {state}")
+    logging.debug("Received callback with code: %s..., state: %s",
+                  auth_code[:10] if auth_code else 'None', state)
     
     if not auth_code:
-        return jsonify({
+        return ojson({
             "success": False,
             "message": "Authorization code not provided"
-        }), 400
+        }, 400)
     
     # Prepare token exchange request
     token_url = "https://services.leadconnectorhq.com/oauth/token"
@@ -79,37 +89,35 @@ def authenticate():
     }
     
     data = {
-        'client_id': client_id,
-        'client_secret': client_secret,
+        'client_id': CFG.client_id,
+        'client_secret': CFG.client_secret,
         'grant_type': 'authorization_code',
         'code': auth_code,
         'user_type': 'Location'
     }
     
-    # Add debugging for the request
-    logging.info(f"Making token request to: {token_url}")
-    logging.info(f"Request data: {dict(data)}")
-    
+    # The request payload is never logged: it carries the client secret
+    # and says nothing actionable when the exchange succeeds
+    logging.debug("Making token request to: %s", token_url)
+
     try:
-        # Make the token exchange request
-        response = requests.post(token_url, headers=headers, data=data)
-        
-        # Log the response details before raising for status
-        logging.info(f"Response status: {response.status_code}")
-        logging.info(f"Response headers: {dict(response.headers)}")
-        
+        # Make the token exchange request over the shared pooled session;
+        # stream=True hands us the raw body without requests building its
+        # own intermediate content copy first
+        response = TOKEN_SESSION.post(token_url, headers=headers, data=data, stream=True, timeout=TOKEN_TIMEOUT)
+
+        logging.debug("Response status: %s", response.status_code)
+        logging.debug("Response headers: %s", response.headers)
+
+        body = response.raw.read(decode_content=True)
+
         if response.status_code != 200:
-            # Log the error response body
-            try:
-                error_body = response.json()
-                logging.error(f"Error response body: {error_body}")
-            except:
-                logging.error(f"Error response text: {response.text}")
-        
+            logging.error("Error response body: %s", body)
+
         response.raise_for_status()
-        
-        # Parse the response
-        token_data = response.json()
+
+        # Parse the response (orjson is several times faster than stdlib json)
+        token_data = orjson.loads(body)
         
         # Extract required data
         access_token = token_data.get('access_token')
@@ -119,15 +127,15 @@ def authenticate():
         
         # Validate that we have all required data
         if not all([access_token, refresh_token, expires_in, location_id]):
-            return jsonify({
+            return ojson({
                 "success": False,
                 "message": "Incomplete token response from OAuth provider"
-            }), 500
+            }, 500)
         
         # Store credentials in database
         store_credentials(location_id, access_token, refresh_token, expires_in)
         
-        return jsonify({
+        return ojson({
             "success": True,
             "message": "Authentication successful",
             "data": {
@@ -139,30 +147,30 @@ def authenticate():
             }
         })
         
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Request exception: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Failed to exchange authorization code: {str(e)}"
-        }), 500
-        
-    except ValueError as e:
-        return jsonify({
-            "success": False,
-            "message": f"Invalid request data: {str(e)}"
-        }), 400
-        
-    except RuntimeError as e:
-        return jsonify({
-            "success": False,
-            "message": f"Database error: {str(e)}"
-        }), 500
-        
     except Exception as e:
-        return jsonify({
+        # Single handler; the status and message are dispatched by type
+        logging.error("Token exchange failed: %s", e)
+        if isinstance(e, requests.exceptions.RequestException):
+            return ojson({
+                "success": False,
+                "message": f"Failed to exchange authorization code: {str(e)}"
+            }, 500)
+        if isinstance(e, ValueError):
+            return ojson({
+                "success": False,
+                "message": f"Invalid request data: {str(e)}"
+            }, 400)
+        if isinstance(e, RuntimeError):
+            return ojson({
+                "success": False,
+                "message": f"Database error: {str(e)}"
+            }, 500)
+        return ojson({
             "success": False,
             "message": f"Unexpected error: {str(e)}"
-        }), 500
+        }, 500)
 
 if __name__ == '__main__':
+    # Dev server is single-process, so the refresher starts inline here
+    start_token_refresher()
     app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
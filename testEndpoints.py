@@ -1,15 +1,17 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint
+from responses import ojson
+import functools
 import logging
-import os
-from dotenv import load_dotenv
-from llib.queryInventory import get_inventory
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from jinja2 import Environment
+from config import CFG
+from llib.queryInventory import get_inventory, extract_total_count
 from llib.checkInventory import check_inventory
-from llib.sendMessage import send_email
-from datetime import datetime
-
-# Load environment variables
-load_dotenv()
-test_location_id = os.getenv('locationId')
+from llib.sendMessage import send_email_bulk
 
 # Configure logging
 logger = logging.getLogger('test_endpoints')
@@ -17,37 +19,79 @@ logger = logging.getLogger('test_endpoints')
 # Create Blueprint for test endpoints
 test_bp = Blueprint('test', __name__)
 
+# Cached endpoint payloads keyed by view name: (payload, fresh_until).
+# Stale entries are kept so they can be served when the upstream fails
+_RESPONSE_CACHE = {}
+_RESPONSE_CACHE_LOCK = threading.Lock()
+RESPONSE_CACHE_TTL = 30  # seconds
+
+def _cached_endpoint(func):
+    """
+    Cache a JSON endpoint's successful payload for RESPONSE_CACHE_TTL
+    seconds. Fresh hits skip the upstream call entirely; when the
+    endpoint errors out but a stale copy exists, the stale payload is
+    served with an X-Cache: STALE header instead of the error.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = func.__name__
+
+        with _RESPONSE_CACHE_LOCK:
+            entry = _RESPONSE_CACHE.get(key)
+
+        if entry and time.monotonic() < entry[1]:
+            response = ojson(entry[0])
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        result = func(*args, **kwargs)
+        response, status = result if isinstance(result, tuple) else (result, result.status_code)
+
+        if status == 200:
+            with _RESPONSE_CACHE_LOCK:
+                _RESPONSE_CACHE[key] = (response.get_json(), time.monotonic() + RESPONSE_CACHE_TTL)
+        elif entry is not None:
+            # Upstream failed but we still hold an expired copy; serving
+            # it beats surfacing a 500 to a monitoring dashboard
+            stale = ojson(entry[0])
+            stale.headers['X-Cache'] = 'STALE'
+            return stale
+
+        return result
+    return wrapper
+
 @test_bp.route('/ping', methods=['GET'])
 def ping():
     """Health check endpoint"""
-    return jsonify({"message": "pong"})
+    return ojson({"message": "pong"})
 
 @test_bp.route('/testInventory', methods=['GET'])
+@_cached_endpoint
 def test_inventory():
     """Test endpoint to get inventory using location ID from environment"""
     try:
-        if not test_location_id:
-            return jsonify({
+        if not CFG.test_location_id:
+            return ojson({
                 "success": False,
                 "message": "locationId not configured in environment variables"
-            }), 500
+            }, 500)
         
-        logger.info(f"Testing inventory retrieval for location_id: {test_location_id}")
+        logger.info("Testing inventory retrieval for location_id: %s", CFG.test_location_id)
         
         # Get inventory using the queryInventory module
-        inventory_data = get_inventory(test_location_id)
+        inventory_data = get_inventory(CFG.test_location_id)
         
         # Extract inventory list
         inventory_list = inventory_data.get('inventory', [])
-        total_count = inventory_data.get('total', [{}])[0].get('total', 0)
+        total_count = extract_total_count(inventory_data)
         
-        logger.info(f"Successfully retrieved {len(inventory_list)} items from total of {total_count}")
+        logger.info("Successfully retrieved %s items from total of %s", len(inventory_list), total_count)
         
-        return jsonify({
+        return ojson({
             "success": True,
-            "message": f"Retrieved inventory for location {test_location_id}",
+            "message": f"Retrieved inventory for location {CFG.test_location_id}",
             "data": {
-                "location_id": test_location_id,
+                "location_id": CFG.test_location_id,
                 "total_items": total_count,
                 "items_retrieved": len(inventory_list),
                 "inventory": inventory_list,
@@ -55,249 +99,301 @@ def test_inventory():
             }
         })
         
-    except ValueError as e:
-        logger.error(f"Invalid request: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Invalid request: {str(e)}"
-        }), 400
-        
-    except RuntimeError as e:
-        logger.error(f"Runtime error: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Error retrieving inventory: {str(e)}"
-        }), 500
-        
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return jsonify({
+        # One handler keeps the function's exception table small; the
+        # status code is picked by type instead of separate clauses
+        logger.error("Inventory retrieval failed: %s", e)
+        if isinstance(e, ValueError):
+            return ojson({
+                "success": False,
+                "message": f"Invalid request: {str(e)}"
+            }, 400)
+        if isinstance(e, RuntimeError):
+            return ojson({
+                "success": False,
+                "message": f"Error retrieving inventory: {str(e)}"
+            }, 500)
+        return ojson({
             "success": False,
             "message": f"Unexpected error: {str(e)}"
-        }), 500
+        }, 500)
 
 @test_bp.route('/checkInventory', methods=['GET'])
+@_cached_endpoint
 def test_check_inventory():
     """Test endpoint to analyze inventory using location ID from environment"""
     try:
-        if not test_location_id:
-            return jsonify({
+        if not CFG.test_location_id:
+            return ojson({
                 "success": False,
                 "message": "locationId not configured in environment variables"
-            }), 500
+            }, 500)
         
-        logger.info(f"Testing inventory check for location_id: {test_location_id}")
+        logger.info("Testing inventory check for location_id: %s", CFG.test_location_id)
         
         # Get inventory using the queryInventory module
-        inventory_data = get_inventory(test_location_id)
+        inventory_data = get_inventory(CFG.test_location_id)
         
         # Analyze inventory using checkInventory module
         analysis_results = check_inventory(inventory_data)
         
-        logger.info(f"Inventory analysis completed: {analysis_results['summary']}")
-        
-        return jsonify({
+        logger.info("Inventory analysis completed: %s", analysis_results['summary'])
+
+        # The analysis carries slotted dataclasses internally; convert to
+        # plain dicts only here at the JSON boundary
+        analysis_payload = {
+            **analysis_results,
+            'out_of_stock_products': [asdict(p) for p in analysis_results['out_of_stock_products']]
+        }
+
+        return ojson({
             "success": True,
-            "message": f"Inventory analysis completed for location {test_location_id}",
+            "message": f"Inventory analysis completed for location {CFG.test_location_id}",
             "data": {
-                "location_id": test_location_id,
-                "analysis": analysis_results,
+                "location_id": CFG.test_location_id,
+                "analysis": analysis_payload,
                 "trace_id": inventory_data.get('traceId', '')
             }
         })
         
-    except ValueError as e:
-        logger.error(f"Invalid request: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Invalid request: {str(e)}"
-        }), 400
-        
-    except RuntimeError as e:
-        logger.error(f"Runtime error: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Error analyzing inventory: {str(e)}"
-        }), 500
-        
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return jsonify({
+        logger.error("Inventory analysis failed: %s", e)
+        if isinstance(e, ValueError):
+            return ojson({
+                "success": False,
+                "message": f"Invalid request: {str(e)}"
+            }, 400)
+        if isinstance(e, RuntimeError):
+            return ojson({
+                "success": False,
+                "message": f"Error analyzing inventory: {str(e)}"
+            }, 500)
+        return ojson({
             "success": False,
             "message": f"Unexpected error: {str(e)}"
-        }), 500
+        }, 500)
 
-@test_bp.route('/testSendEmail', methods=['GET'])
-def test_send_email():
-    """Test endpoint to analyze inventory and send results via email to predefined recipients"""
+# Background workers for the analysis-and-email pipeline, plus an
+# in-memory job board so callers can poll for the outcome
+_email_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='email-job')
+_JOBS = {}
+_JOBS_LOCK = threading.Lock()
+
+# Finished jobs past this count are evicted oldest-first, so the board
+# can't grow without bound as /testSendEmail requests accumulate
+JOBS_MAX = 100
+
+def _set_job(job_id, result):
+    with _JOBS_LOCK:
+        _JOBS[job_id] = result
+        if len(_JOBS) > JOBS_MAX:
+            # Dicts iterate in insertion order, so the oldest entries come
+            # first; queued jobs are kept because a worker still owns them
+            done = [k for k, v in _JOBS.items() if v.get('status') != 'queued']
+            for key in done[:len(_JOBS) - JOBS_MAX]:
+                del _JOBS[key]
+
+def _do_analysis_and_email(job_id, location_id, target_emails):
+    """
+    Worker that runs the full inventory analysis and email fan-out.
+
+    Runs on the background executor so the HTTP request never waits on
+    the upstream API or SMTP; progress is recorded on the job board.
+    """
     try:
-        # Hardcoded list of email addresses
-        target_emails = [
-            "kelvin@adrianwee.com",
-            "kelinelam@adrianwee.com", 
-            "johnny@adrianwee.com",
-            "jinxuan@adrianwee.com",
-            "leeyang4378@gmail.com"
-        ]
-        
-        if not test_location_id:
-            return jsonify({
-                "success": False,
-                "message": "locationId not configured in environment variables"
-            }), 500
-        
-        logger.info(f"Processing inventory analysis and email for location_id: {test_location_id}")
-        
         # Step 1: Get inventory data
-        logger.info("Step 1: Fetching inventory data...")
-        inventory_data = get_inventory(test_location_id)
-        
+        logger.info("Job %s step 1: Fetching inventory data...", job_id)
+        inventory_data = get_inventory(location_id)
+
         # Step 2: Analyze inventory
-        logger.info("Step 2: Analyzing inventory...")
+        logger.info("Job %s step 2: Analyzing inventory...", job_id)
         analysis_results = check_inventory(inventory_data)
-        
+
         # Step 3: Format results into a pretty table
-        logger.info("Step 3: Formatting email content...")
-        email_content = format_inventory_analysis_email(analysis_results, test_location_id)
-        
+        logger.info("Job %s step 3: Formatting email content...", job_id)
+        email_content = format_inventory_analysis_email(analysis_results, location_id)
+
         # Step 4: Send email to all recipients
-        logger.info(f"Step 4: Sending emails to {len(target_emails)} recipients...")
-        
-        sent_emails = []
-        failed_emails = []
-        
-        for email in target_emails:
-            try:
-                send_email(
-                    target_email=email,
-                    message=email_content,
-                    subject=f"Inventory Analysis Report - Location {test_location_id}"
-                )
-                sent_emails.append(email)
-                logger.info(f"Email sent successfully to {email}")
-            except Exception as e:
-                failed_emails.append({"email": email, "error": str(e)})
-                logger.error(f"Failed to send email to {email}: {str(e)}")
-        
-        # Determine overall success
-        overall_success = len(sent_emails) > 0
-        
-        return jsonify({
-            "success": overall_success,
-            "message": f"Inventory analysis completed. Emails sent to {len(sent_emails)} out of {len(target_emails)} recipients",
-            "data": {
-                "location_id": test_location_id,
-                "total_recipients": len(target_emails),
-                "emails_sent": len(sent_emails),
-                "emails_failed": len(failed_emails),
-                "sent_to": sent_emails,
-                "failed_recipients": failed_emails,
-                "analysis_summary": analysis_results['summary'],
-                "trace_id": inventory_data.get('traceId', '')
-            }
+        logger.info("Job %s step 4: Sending emails to %s recipients...", job_id, len(target_emails))
+
+        # One bulk call: the MIME payload is built once and every
+        # recipient shares a single authenticated SMTP connection
+        outcome = send_email_bulk(
+            target_emails,
+            email_content,
+            subject=f"Inventory Analysis Report - Location {location_id}"
+        )
+        sent_emails = outcome['sent']
+        failed_emails = outcome['failed']
+
+        _set_job(job_id, {
+            "status": "completed" if sent_emails else "failed",
+            "location_id": location_id,
+            "total_recipients": len(target_emails),
+            "emails_sent": len(sent_emails),
+            "emails_failed": len(failed_emails),
+            "sent_to": sent_emails,
+            "failed_recipients": failed_emails,
+            "analysis_summary": analysis_results['summary'],
+            "trace_id": inventory_data.get('traceId', '')
         })
-        
-    except ValueError as e:
-        logger.error(f"Invalid request: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Invalid request: {str(e)}"
-        }), 400
-        
-    except RuntimeError as e:
-        logger.error(f"Runtime error: {str(e)}")
-        return jsonify({
-            "success": False,
-            "message": f"Error processing request: {str(e)}"
-        }), 500
-        
+
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return jsonify({
+        logger.error("Email job %s failed: %s", job_id, e)
+        _set_job(job_id, {"status": "failed", "error": str(e)})
+
+@test_bp.route('/testSendEmail', methods=['GET'])
+def test_send_email():
+    """Queue an inventory analysis and email run, returning 202 immediately"""
+    # Hardcoded list of email addresses
+    target_emails = [
+        "kelvin@adrianwee.com",
+        "kelinelam@adrianwee.com",
+        "johnny@adrianwee.com",
+        "jinxuan@adrianwee.com",
+        "leeyang4378@gmail.com"
+    ]
+
+    if not CFG.test_location_id:
+        return ojson({
             "success": False,
-            "message": f"Unexpected error: {str(e)}"
-        }), 500
+            "message": "locationId not configured in environment variables"
+        }, 500)
 
-def format_inventory_analysis_email(analysis_results, location_id):
-    """
-    Format inventory analysis results into a pretty email message
-    
-    Args:
-        analysis_results (dict): Results from check_inventory function
-        location_id (str): The location ID being analyzed
-        
-    Returns:
-        str: Formatted email content
-    """
-    # Extract data
-    total_products = analysis_results.get('total_products', 0)
-    in_stock_count = analysis_results.get('in_stock_count', 0)
-    out_of_stock_count = analysis_results.get('out_of_stock_count', 0)
-    out_of_stock_products = analysis_results.get('out_of_stock_products', [])
-    
-    email_content = f"""
+    # Validate up front, then hand the slow work (upstream API, SMTP) to
+    # the executor so the caller gets an answer in milliseconds
+    job_id = str(uuid.uuid4())
+    _set_job(job_id, {"status": "queued"})
+    _email_executor.submit(_do_analysis_and_email, job_id, CFG.test_location_id, target_emails)
+
+    logger.info("Queued inventory analysis and email job %s for location_id: %s", job_id, CFG.test_location_id)
+
+    return ojson({
+        "success": True,
+        "message": f"Inventory analysis and email queued for location {CFG.test_location_id}",
+        "data": {
+            "job_id": job_id,
+            "status": "queued",
+            "location_id": CFG.test_location_id,
+            "total_recipients": len(target_emails)
+        }
+    }, 202)
+
+@test_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll the status of a queued email job"""
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+
+    if job is None:
+        return ojson({
+            "success": False,
+            "message": f"No job found with id: {job_id}"
+        }, 404)
+
+    return ojson({
+        "success": True,
+        "data": {"job_id": job_id, **job}
+    })
+
+# Shortage priority tiers: first entry whose threshold the out-of-stock
+# percentage exceeds wins, replacing the old if/elif chain
+_PRIORITY_TIERS = (
+    (20, "⚠️ HIGH PRIORITY: Significant inventory shortage detected"),
+    (10, "⚡ MEDIUM PRIORITY: Notable inventory shortage"),
+    (-1, "✅ LOW PRIORITY: Minor inventory shortage"),
+)
+
+EMAIL_TEMPLATE = """
 INVENTORY ANALYSIS REPORT
 ========================
 
-Location ID: {location_id}
-Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Location ID: {{ location_id }}
+Report Generated: {{ generated }}
 
 SUMMARY
 -------
-Total Products:        {total_products}
-In Stock Products:     {in_stock_count}
-Out of Stock Products: {out_of_stock_count}
+Total Products:        {{ total_products }}
+In Stock Products:     {{ in_stock_count }}
+Out of Stock Products: {{ out_of_stock_count }}
 
 INVENTORY STATUS
 ---------------
-"""
-    
-    if out_of_stock_count > 0:
-        email_content += f"""
-OUT OF STOCK ITEMS ({out_of_stock_count} items)
-{'='*50}
-{'Product Name':<30} {'Variant':<20} {'Qty':<5}
-{'-'*55}
-"""
-        
-        for product in out_of_stock_products[:20]:  # Limit to first 20 items
-            product_name = product.get('product_name', 'Unknown')[:29]
-            variant_name = product.get('variant_name', 'Unknown')[:19]
-            quantity = product.get('available_quantity', 0)
-            
-            email_content += f"{product_name:<30} {variant_name:<20} {quantity:<5}\n"
-        
-        if len(out_of_stock_products) > 20:
-            email_content += f"\n... and {len(out_of_stock_products) - 20} more items out of stock\n"
-    else:
-        email_content += "\n🎉 ALL PRODUCTS ARE IN STOCK! 🎉\n"
-    
-    email_content += f"""
+{% if out_of_stock_count %}
+OUT OF STOCK ITEMS ({{ out_of_stock_count }} items)
+==================================================
+{{ "%-30s %-20s %-5s" % ("Product Name", "Variant", "Qty") }}
+-------------------------------------------------------
+{% for row in rows %}
+{{ row }}
+{% endfor %}
+{% if remaining %}
+
+... and {{ remaining }} more items out of stock
+{% endif %}
+{% else %}
+🎉 ALL PRODUCTS ARE IN STOCK! 🎉
+{% endif %}
 
 RECOMMENDATIONS
 --------------
-"""
-    
-    if out_of_stock_count > 0:
-        percentage_out = (out_of_stock_count / total_products) * 100 if total_products > 0 else 0
-        email_content += f"• {percentage_out:.1f}% of products are out of stock\n"
-        email_content += f"• Consider restocking the {out_of_stock_count} out-of-stock items\n"
-        
-        if percentage_out > 20:
-            email_content += "• ⚠️ HIGH PRIORITY: Significant inventory shortage detected\n"
-        elif percentage_out > 10:
-            email_content += "• ⚡ MEDIUM PRIORITY: Notable inventory shortage\n"
-        else:
-            email_content += "• ✅ LOW PRIORITY: Minor inventory shortage\n"
-    else:
-        email_content += "• ✅ Inventory levels look great!\n"
-        email_content += "• Continue monitoring stock levels regularly\n"
-    
-    email_content += f"""
+{% if out_of_stock_count %}
+• {{ pct }}% of products are out of stock
+• Consider restocking the {{ out_of_stock_count }} out-of-stock items
+• {{ priority }}
+{% else %}
+• ✅ Inventory levels look great!
+• Continue monitoring stock levels regularly
+{% endif %}
 
 ---
 This report was automatically generated by GHL Utils
 For support, contact your system administrator
 """
-    
-    return email_content
\ No newline at end of file
+
+# Parsed once at import; rendering reuses the compiled template instead
+# of re-evaluating a pile of f-string blocks per report
+_jinja_env = Environment(trim_blocks=True, lstrip_blocks=True, autoescape=False)
+_EMAIL_TPL = _jinja_env.from_string(EMAIL_TEMPLATE)
+
+# Format spec bound once; the row loop reuses the parsed spec instead of
+# running fresh f-string formatting bytecode per row
+ROW_FMT = "{name:<30} {variant:<20} {qty:<5}".format_map
+
+def format_inventory_analysis_email(analysis_results, location_id):
+    """
+    Format inventory analysis results into a pretty email message
+
+    Args:
+        analysis_results (dict): Results from check_inventory function
+        location_id (str): The location ID being analyzed
+
+    Returns:
+        str: Formatted email content
+    """
+    # Extract data
+    total_products = analysis_results.get('total_products', 0)
+    in_stock_count = analysis_results.get('in_stock_count', 0)
+    out_of_stock_count = analysis_results.get('out_of_stock_count', 0)
+    out_of_stock_products = analysis_results.get('out_of_stock_products', [])
+
+    # Compute the shortage percentage once up front; the template only
+    # receives finished values
+    percentage_out = (out_of_stock_count / total_products * 100) if total_products else 0.0
+
+    rows = [
+        ROW_FMT({'name': p.product_name[:29], 'variant': p.variant_name[:19], 'qty': p.available_quantity})
+        for p in out_of_stock_products[:20]  # Limit to first 20 items
+    ]
+
+    return _EMAIL_TPL.render(
+        location_id=location_id,
+        generated=time.strftime('%Y-%m-%d %H:%M:%S'),
+        total_products=total_products,
+        in_stock_count=in_stock_count,
+        out_of_stock_count=out_of_stock_count,
+        rows=rows,
+        remaining=max(0, len(out_of_stock_products) - 20),
+        pct=f"{percentage_out:.1f}",
+        priority=next(msg for threshold, msg in _PRIORITY_TIERS if percentage_out > threshold),
+    )